@@ -0,0 +1,173 @@
+import asyncio
+import gc
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from wraptimer import TimeIt
+
+
+def test_byline_times_the_last_line():
+    @TimeIt(verbose=False).byline
+    def one_line():
+        return sum(range(1000))
+
+    result, traced, _ = one_line()
+    first = one_line.__wrapped__.__code__.co_firstlineno
+    assert result == 499500
+    assert [entry["LINE"] for entry in traced] == [first + 2]
+
+
+def test_byline_times_each_await():
+    @TimeIt(verbose=False).byline
+    async def awaits():
+        await asyncio.sleep(0.01)
+        await asyncio.sleep(0)
+
+    _, traced, _ = asyncio.run(awaits())
+    first = awaits.__wrapped__.__code__.co_firstlineno
+    assert [entry["LINE"] for entry in traced] == [first + 2, first + 3]
+
+
+def test_byline_verbose_prints_title_bar(capsys):
+    @TimeIt().byline
+    def one_line():
+        return 1
+
+    one_line()
+    assert "[ SYNC FUNC: one_line ]" in capsys.readouterr().out
+
+
+def test_byline_times_the_raising_line(capsys):
+    @TimeIt().byline
+    def fails():
+        x = 1
+        raise RuntimeError(x)
+
+    with pytest.raises(RuntimeError):
+        fails()
+    first = fails.__wrapped__.__code__.co_firstlineno
+    out = capsys.readouterr().out
+    assert f"LINE: {first + 2}," in out
+    assert f"LINE: {first + 3}," in out
+
+
+def _branch(n):
+    # runs a different line per caller, so mixed up traces show
+    if n % 2:
+        time.sleep(0.01)
+    else:
+        time.sleep(0.02)
+    return n
+
+
+def _expected_lines(func, n):
+    first = func.__code__.co_firstlineno
+    return [first + 2, first + (3 if n % 2 else 5), first + 6]
+
+
+def test_byline_threads_keep_their_own_lines():
+    traced_branch = TimeIt(verbose=False).byline(_branch)
+    results = {}
+
+    def run(n):
+        results[n] = traced_branch(n)
+
+    threads = [threading.Thread(target=run, args=(n,)) for n in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for n, (result, traced, _) in results.items():
+        assert result == n
+        assert [entry["LINE"] for entry in traced] == _expected_lines(_branch, n)
+    assert gc.isenabled()
+    assert sys.gettrace() is None
+
+
+def test_byline_gathered_tasks_keep_their_own_lines():
+    @TimeIt(verbose=False).byline
+    async def branch(n):
+        if n % 2:
+            await asyncio.sleep(0.01)
+        else:
+            await asyncio.sleep(0.02)
+        return n
+
+    async def main():
+        return await asyncio.gather(*(branch(n) for n in range(6)))
+
+    for n, (result, traced, _) in enumerate(asyncio.run(main())):
+        assert result == n
+        assert [entry["LINE"] for entry in traced] == _expected_lines(
+            branch.__wrapped__, n
+        )
+    assert gc.isenabled()
+
+
+def _slow_middle_line():
+    x = 1
+    time.sleep(0.02)
+    return x
+
+
+def test_min_line_ns_drops_fast_lines():
+    traced_func = TimeIt(verbose=False, min_line_ns=5_000_000).byline(_slow_middle_line)
+
+    result, traced, _ = traced_func()
+    assert result == 1
+    first = _slow_middle_line.__code__.co_firstlineno
+    assert [entry["LINE"] for entry in traced] == [first + 2]
+
+
+def test_min_line_ns_summarises_skipped_lines(capsys):
+    TimeIt(min_line_ns=5_000_000).byline(_slow_middle_line)()
+
+    out = capsys.readouterr().out
+    first = _slow_middle_line.__code__.co_firstlineno
+    assert f"LINE: {first + 2}," in out
+    assert f"LINE: {first + 1}," not in out
+    assert "(2 lines < 5.0 ms skipped)" in out
+
+
+def test_byline_without_trace_keeps_the_byline_shape():
+    @TimeIt(verbose=False).byline(trace=False)
+    def untraced():
+        return 1
+
+    result, traced, trace = untraced()
+    assert result == 1
+    assert traced == []
+    assert trace[0].startswith(" TOOK: ")
+    assert untraced.__name__ == "untraced"
+
+
+def test_byline_without_trace_prints_the_total_only(capsys):
+    @TimeIt().byline(trace=False)
+    def untraced():
+        x = 1
+        return x
+
+    assert untraced() == 1
+    out = capsys.readouterr().out
+    assert "[ SYNC FUNC: untraced ]" in out
+    assert "LINE:" not in out
+
+
+def test_wraptimer_disable_returns_functions_untouched():
+    code = (
+        "from wraptimer import TimeIt\n"
+        "def f(): return 1\n"
+        "timeit = TimeIt(verbose=False)\n"
+        "assert timeit.byline(f) is f\n"
+        "assert timeit.byline(trace=False)(f) is f\n"
+        "assert timeit.func(f) is f\n"
+    )
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, WRAPTIMER_DISABLE="1", PYTHONPATH=root)
+    subprocess.run([sys.executable, "-c", code], env=env, check=True)
@@ -0,0 +1,148 @@
+import asyncio
+import gc
+import time
+import weakref
+
+import pytest
+
+from wraptimer import TimeIt, Timer, timed
+
+
+@pytest.fixture(autouse=True)
+def gc_enabled():
+    gc.enable()
+    yield
+    assert gc.isenabled()
+
+
+def test_nested_timers_restore_gc_once():
+    with Timer():
+        with Timer():
+            assert not gc.isenabled()
+        # the outer timer is still measuring
+        assert not gc.isenabled()
+    assert gc.isenabled()
+
+
+def test_stop_without_start_leaves_gc_alone():
+    with pytest.raises(ValueError, match="not been started"):
+        Timer().stop()
+    assert gc.isenabled()
+
+
+@pytest.mark.parametrize("decorator", ["func", "byline"])
+def test_gc_restored_when_sync_function_raises(decorator):
+    timeit = TimeIt(verbose=False)
+
+    @getattr(timeit, decorator)
+    def fails():
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        fails()
+    assert gc.isenabled()
+
+
+@pytest.mark.parametrize("decorator", ["func", "byline"])
+def test_gc_restored_when_task_is_cancelled(decorator):
+    timeit = TimeIt(verbose=False)
+
+    @getattr(timeit, decorator)
+    async def sleeps():
+        await asyncio.sleep(10)
+
+    async def main():
+        task = asyncio.create_task(sleeps())
+        await asyncio.sleep(0)
+        assert not gc.isenabled()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    assert gc.isenabled()
+
+
+def test_freeze_keeps_application_frozen_objects():
+    gc.freeze()
+    try:
+        frozen = gc.get_freeze_count()
+        with Timer(freeze=True):
+            pass
+        assert gc.get_freeze_count() == frozen
+    finally:
+        gc.unfreeze()
+
+
+def test_freeze_unfreezes_what_it_froze():
+    before = gc.get_freeze_count()
+    with Timer(freeze=True):
+        assert gc.get_freeze_count() > before
+    assert gc.get_freeze_count() <= before
+
+
+def test_restarted_timer_is_not_stopped():
+    t = Timer()
+    t.start()
+    t.stop()
+    t.start()
+    assert t.time_nanosec is None
+    with pytest.raises(ValueError, match="not been stopped"):
+        t.time_string
+    t.stop()
+    assert t.time_string
+
+
+def test_low_precision_is_scaled_to_nanoseconds():
+    with Timer(timer_type="low_precision") as t:
+        time.sleep(0.02)
+    assert 10_000_000 < t.time_nanosec < 1_000_000_000
+    assert t.time_millisec == pytest.approx(t.time_nanosec / 1e6)
+    assert t.time_units.units == "ms"
+
+
+class _Cycle:
+    def __init__(self):
+        self.me = self
+
+
+def test_collect_before_collects_garbage_before_timing():
+    ref = weakref.ref(_Cycle())
+    with Timer(collect_before=True):
+        assert ref() is None
+
+
+def test_timer_as_context_manager():
+    with Timer() as t:
+        time.sleep(0.01)
+    assert t.time_nanosec >= 10_000_000
+    assert t.time_string.endswith(" ms")
+
+
+def test_timed_records_last_ns():
+    @timed
+    def sleeps():
+        time.sleep(0.01)
+        return 1
+
+    assert sleeps.last_ns is None
+    assert sleeps() == 1
+    assert sleeps.last_ns >= 10_000_000
+    assert sleeps.__name__ == "sleeps"
+
+
+def test_timed_async_with_timer_type():
+    @timed(timer_type="process")
+    async def sleeps():
+        await asyncio.sleep(0.01)
+        return 1
+
+    assert asyncio.run(sleeps()) == 1
+    # process time doesn't count sleeping
+    assert 0 <= sleeps.last_ns < 10_000_000
+
+
+@pytest.mark.parametrize("make", [Timer, lambda timer_type: timed(timer_type=timer_type)])
+def test_unknown_timer_type(make):
+    with pytest.raises(ValueError, match="Unknown timer_type 'wall'"):
+        make(timer_type="wall")
@@ -6,4 +6,4 @@
 """
 
 from .timeit import TimeIt
-from .timer import Timer
+from .timer import Timer, timed
@@ -5,10 +5,14 @@
  https://opensource.org/licenses/MIT
 """
 import asyncio
+import os
 from functools import wraps
 
 from .timer import Timer
-from .utils import DebugContext, log
+from .utils import DebugContext, func_type_string, log
+
+# WRAPTIMER_DISABLE=1 turns every decorator into a passthrough
+_DISABLED = os.environ.get("WRAPTIMER_DISABLE") == "1"
 
 
 class TimeIt:
@@ -97,14 +101,36 @@ class TimeIt:
             times of the same functions but passing varying arguments.
             That way you c`an see how each argument affects execution time.
 
+    - `min_line_ns` int : Defaults to `0`. Lines that run faster than this
+    many nanoseconds are left out of `@byline` output and only counted in a
+    single `(N lines < threshold skipped)` summary.
+
+        **Example:**
+        ```python
+        # only report lines that take at least 1ms
+        timeit = TimeIt(min_line_ns=1_000_000)
+        ```
+        !!! note
+            This is useful for high-volume functions, where most lines are
+            trivial assignments and per-line output is mostly noise.
+
+    !!! note
+        Set the `WRAPTIMER_DISABLE=1` environment variable to make both
+        decorators return the decorated function untouched. It is read once
+        at import, so production deployments pay no timing overhead at all.
+        Keep in mind that with `verbose=False` the functions then return
+        their plain result instead of a tuple.
 
     """
 
-    def __init__(self, verbose: bool = True, show_args: bool = False):
+    def __init__(
+        self, verbose: bool = True, show_args: bool = False, min_line_ns: int = 0
+    ):
         self.verbose = verbose
         self.show_args = show_args
+        self.min_line_ns = min_line_ns
 
-    def byline(self, func):
+    def byline(self, func=None, *, trace: bool = True):
         """Function decorator to print duration taken to run decorated function
         line by line.
         Works for both sync and async functions.
@@ -121,57 +147,64 @@ class TimeIt:
         def func_to_time():
             timer.sleep(1)
         ```
+
+        Pass `trace=False`, as in `@timeit.byline(trace=False)`, to only time
+        the whole function like `@timeit.func` does, without any line tracing.
+        With `verbose=False` the result keeps the `byline` shape, with an empty
+        list of lines: `(result, [], [' TOOK: ...'])`.
         """
 
+        if func is None:
+            return lambda func: self.byline(func, trace=trace)
+
+        if _DISABLED:
+            return func
+
+        if not trace:
+            return self._time_whole(func, with_lines=True)
+
+        is_coro = asyncio.iscoroutinefunction(func)
+        func_type_str = func_type_string(func)
+        code = func.__code__
+        name = func.__name__
+        title = f"{func_type_str}: {name}"
+
+        if is_coro:
+
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                debug_context = DebugContext(
+                    name=name,
+                    func=func,
+                    verbose=self.verbose,
+                    func_type_str=func_type_str,
+                    code=code,
+                    min_line_ns=self.min_line_ns,
+                )
+                # the timer is stopped, and gc restored, even if func raises
+                with debug_context, Timer() as t:
+                    result = await func(*args, **kwargs)
+
+                return self._byline_result(title, t, debug_context, result, args, kwargs)
+
+            return async_wrapper
+
         @wraps(func)
-        async def wrapper(*args, **kwargs):
+        def sync_wrapper(*args, **kwargs):
             debug_context = DebugContext(
-                name=func.__name__, verbose=self.verbose, func=func
+                name=name,
+                func=func,
+                verbose=self.verbose,
+                func_type_str=func_type_str,
+                code=code,
+                min_line_ns=self.min_line_ns,
             )
-            with debug_context:
-                t = Timer()
-                t.start()
+            with debug_context, Timer() as t:
+                result = func(*args, **kwargs)
 
-                # run with await if async function
-                if asyncio.iscoroutinefunction(func):
-                    result = await func(*args, **kwargs)
-                else:
-                    result = func(*args, **kwargs)
-
-                t.stop()
-
-                # print(debug_context.traced)
-                if self.verbose:
-                    log(
-                        what=func,
-                        t=t,
-                        args=args,
-                        kwargs=kwargs,
-                        show_args=self.show_args,
-                        draw_sep=["bottom", "mid"],
-                    )
-                    return result
-                else:
-                    return (
-                        result,
-                        debug_context.traced,
-                        log(
-                            func,
-                            t,
-                            args,
-                            kwargs,
-                            self.show_args,
-                            return_trace=True,
-                        ),
-                    )
-
-        def run(*args, **kwargs):
-            return asyncio.run(wrapper(*args, **kwargs))
-
-        async def async_run(*args, **kwargs):
-            return await wrapper(*args, **kwargs)
-
-        return async_run if asyncio.iscoroutinefunction(func) else run
+            return self._byline_result(title, t, debug_context, result, args, kwargs)
+
+        return sync_wrapper
 
     def func(self, func: callable) -> None:
         """Function decorator to print duration taken to run decorated function.
@@ -191,47 +224,86 @@ class TimeIt:
         ```
         """
 
+        if _DISABLED:
+            return func
+
+        return self._time_whole(func)
+
+    def _time_whole(self, func, with_lines=False):
+        # with_lines keeps byline's (result, lines, log) shape when not verbose
+        title = f"{func_type_string(func)}: {func.__name__}"
+
+        if asyncio.iscoroutinefunction(func):
+
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with Timer() as t:
+                    result = await func(*args, **kwargs)
+
+                return self._func_result(title, t, result, args, kwargs, with_lines)
+
+            return async_wrapper
+
         @wraps(func)
-        async def wrapper(*args, **kwargs):
-            t = Timer()
-            t.start()
-
-            # run with await if async function
-            if asyncio.iscoroutinefunction(func):
-                result = await func(*args, **kwargs)
-            else:
+        def sync_wrapper(*args, **kwargs):
+            with Timer() as t:
                 result = func(*args, **kwargs)
 
-            t.stop()
-
-            # if verbose, log
-            if self.verbose:
+            return self._func_result(title, t, result, args, kwargs, with_lines)
+
+        return sync_wrapper
+
+    def _byline_result(self, title, t, debug_context, result, args, kwargs):
+        # line timings are logged as the context exits, the total goes after them
+        if self.verbose:
+            log(
+                what="",
+                t=t,
+                title=title,
+                args=args,
+                kwargs=kwargs,
+                show_args=self.show_args,
+                draw_sep=["bottom", "mid"],
+            )
+            return result
+        else:
+            return (
+                result,
+                [entry.report_dict() for entry in debug_context.traced],
                 log(
-                    what=func,
+                    what="",
                     t=t,
+                    title=title,
                     args=args,
                     kwargs=kwargs,
                     show_args=self.show_args,
-                    draw_sep=["top", "bottom"],
-                )
-                return result
-            else:
-                return (
-                    result,
-                    log(
-                        wht=func,
-                        t=t,
-                        args=args,
-                        kwargs=kwargs,
-                        show_args=self.show_args,
-                        return_trace=True,
-                    ),
-                )
-
-        def run(*args, **kwargs):
-            return asyncio.run(wrapper(*args, **kwargs))
-
-        async def async_run(*args, **kwargs):
-            return await wrapper(*args, **kwargs)
+                    return_trace=True,
+                ),
+            )
 
-        return async_run if asyncio.iscoroutinefunction(func) else run
+    def _func_result(self, title, t, result, args, kwargs, with_lines=False):
+        # if verbose, log
+        if self.verbose:
+            log(
+                what="",
+                t=t,
+                title=title,
+                args=args,
+                kwargs=kwargs,
+                show_args=self.show_args,
+                draw_sep=["top", "bottom"],
+            )
+            return result
+        else:
+            trace = log(
+                what="",
+                t=t,
+                title=title,
+                args=args,
+                kwargs=kwargs,
+                show_args=self.show_args,
+                return_trace=True,
+            )
+            if with_lines:
+                return (result, [], trace)
+            return (result, trace)
@@ -5,9 +5,46 @@
  https://opensource.org/licenses/MIT
 """
 
+import asyncio
 import gc
+import threading
 import time
-from typing import Literal, NoReturn, Optional
+from functools import wraps
+from typing import Callable, Literal, NamedTuple, Optional, Tuple
+
+# Number of running timers that want garbage collection off. Only the first
+# one disables gc and only the last one restores it, so nested timers don't
+# switch it back on while an outer timer is still measuring.
+_gc_disable_depth = 0
+_gc_was_enabled = False
+# same for timers asking for gc.freeze()
+_gc_freeze_depth = 0
+# whether the first of those actually froze, see _disable_gc()
+_gc_froze = False
+# objects the interpreter itself keeps frozen (some CPython builds start with
+# a non-empty permanent generation), anything above this the application froze
+_gc_base_freeze_count = gc.get_freeze_count()
+_gc_lock = threading.Lock()
+
+_NS_PER_S = 1e9
+_NS_PER_MS = 1e6
+_NS_PER_US = 1e3
+
+_COUNTERS = {
+    "performance": time.perf_counter_ns,
+    "process": time.process_time_ns,
+    "long_running": time.monotonic_ns,
+    "low_precision": time.time,
+}
+# clocks above that count in seconds rather than nanoseconds
+_NS_SCALE = {"low_precision": _NS_PER_S}
+
+
+class TimeUnit(NamedTuple):
+    """A duration in its largest fitting unit, e.g. `TimeUnit(1.5, "ms")`"""
+
+    value: float
+    units: str
 
 
 class Timer:
@@ -26,6 +63,10 @@ class Timer:
         2. "process": measures the CPU time, meaning sleep time is not measured.
         3. "long_running": it is an increasing clock that do not change when
             the date and or time of the machine is changed.
+        4. "low_precision": the system wall clock (`time.time`). It is a bit
+            cheaper to read than "performance" but has coarser resolution and
+            jumps if the machine's clock is changed, so only use it for
+            long measurements where nanoseconds don't matter.
 
     - `disable_garbage_collect` (bool, optional):
         Determines if garbage collection is disabled.
@@ -36,6 +77,35 @@ class Timer:
             With high precision timers, it is best to disable garbage collection
             so that it does not affect how long the code actually takes to run.
 
+    - `freeze` (bool, optional):
+        Determines if `gc.freeze()` is called once garbage collection is
+        disabled, and `gc.unfreeze()` when the timer stops. Existing objects
+        then leave the young generations, so a collection that runs right
+        after the timer stops has less to scan and does not inflate the next
+        measurement. Only used when `disable_garbage_collect` is True.
+        Nothing is frozen if the application has called `gc.freeze()` itself
+        since wraptimer was imported, so its frozen objects are never thawed.
+
+        Defaults to False.
+
+    - `collect_before` (bool, optional):
+        Determines if a full `gc.collect()` runs in `start()` before the clock
+        is read, so garbage left by earlier code is not collected while
+        measuring and back to back measurements vary less. The collection
+        itself is not timed, but it does cost time on every `start()`, so it
+        is best kept for benchmarks rather than timers on hot paths.
+
+        Defaults to False.
+
+    ## Attributes:
+    Set by `stop()` and `None` until the timer has been stopped.
+
+    - `time_nanosec` (int): nanoseconds taken from start() to stop().
+        A float when `timer_type` is "low_precision".
+    - `time_sec` (float): seconds taken from start() to stop().
+    - `time_millisec` (float): milliseconds taken from start() to stop().
+    - `time_microsec` (float): microseconds taken from start() to stop().
+
 
     # Example Usage
 
@@ -55,121 +125,257 @@ class Timer:
     # get duration taken to run
     print('took', t.time_string)
 
+    ```
+
+    A timer is also a context manager that starts on entry and stops on exit.
+
+    ```python
+    with Timer() as t:
+        time.sleep(1)
+
+    print('took', t.time_string)
     ```
     """
 
-    _counter_start: Optional[int] = None
-    _counter_stop: Optional[int] = None
-    _is_started = False
+    __slots__ = (
+        "timer_type",
+        "disable_garbage_collect",
+        "freeze",
+        "collect_before",
+        "_get_counter",
+        "_ns_scale",
+        "_counter_start",
+        "_is_valid",
+        "time_nanosec",
+        "time_sec",
+        "time_millisec",
+        "time_microsec",
+    )
 
     def __init__(
         self,
-        timer_type: Literal["performance", "process", "long_running"] = "performance",
+        timer_type: Literal[
+            "performance", "process", "long_running", "low_precision"
+        ] = "performance",
         disable_garbage_collect: bool = True,
+        freeze: bool = False,
+        collect_before: bool = False,
     ) -> None:
+        # resolve the clock once so start() and stop() are a single call
+        self._get_counter, self._ns_scale = _resolve_counter(timer_type)
+
         self.timer_type = timer_type
         self.disable_garbage_collect = disable_garbage_collect
+        self.freeze = freeze
+        self.collect_before = collect_before
+        # 0 means "not started", keeping the counter a plain number.
+        # It doubles as the "running" flag, stop() zeroes it
+        self._counter_start = 0
+        # set once stop() has measured something
+        self._is_valid = False
+        self.time_nanosec: Optional[int] = None
+        self.time_sec: Optional[float] = None
+        self.time_millisec: Optional[float] = None
+        self.time_microsec: Optional[float] = None
 
     def start(self) -> None:
         """Starts the timer ."""
-        if self._is_started:
+        if self._counter_start:
             return
 
+        if self.collect_before:
+            gc.collect()
         if self.disable_garbage_collect:
-            gc.disable()
-        self._counter_start = self.__get_counter()
-
-        self._is_started = True
+            _disable_gc(self.freeze)
+        # the previous measurement no longer describes this run
+        self._is_valid = False
+        self.time_nanosec = None
+        self.time_sec = None
+        self.time_millisec = None
+        self.time_microsec = None
+        self._counter_start = self._get_counter()
 
     def stop(self) -> None:
         """Stops the timer ."""
-        self._counter_stop = self.__get_counter()
+        counter_stop = self._get_counter()
+        counter_start = self._counter_start
+        if not counter_start:
+            raise ValueError("Timer has not been started.")
+
+        self._counter_start = 0
         if self.disable_garbage_collect:
-            gc.enable()
+            _restore_gc(self.freeze)
 
-        self._is_started = False
+        # work out every unit once here rather than on each read
+        elapsed = counter_stop - counter_start
+        nanosec = elapsed * self._ns_scale
+        self.time_nanosec = nanosec
+        self.time_sec = nanosec / _NS_PER_S
+        self.time_millisec = nanosec / _NS_PER_MS
+        self.time_microsec = nanosec / _NS_PER_US
+        self._is_valid = True
 
-    @property
-    def time_nanosec(self) -> float:
-        """Get number of nanoseconds taken from start() to stop().
+    def __enter__(self) -> "Timer":
+        self.start()
+        return self
 
-        Returns:
-            `float`: nanoseconds as a float
-        """
-        self.__valid_start_stop()
-        return self._counter_stop - self._counter_start  # type: ignore
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
 
     @property
-    def time_sec(self) -> float:
-        """Get number of seconds taken from start() to stop().
+    def time_units(self) -> TimeUnit:
+        """Get time taken from start() to stop() in the largest fitting unit.
 
         Returns:
-            `float`: seconds as a float
+            `TimeUnit`: the `(value, units)` pair, e.g. `TimeUnit(1.5, "ms")`
         """
-        return self.time_nanosec / 1e9
+        if not self._is_valid:
+            # stop() sets the flag, so a correctly used timer skips this
+            if not self._counter_start:
+                raise ValueError("Timer has not been started.")
+            raise ValueError("Timer has not been stopped.")
+        return _time_units(self.time_nanosec)
 
     @property
-    def time_millisec(self) -> float:
-        """Get number of milliseconds taken from start() to stop().
+    def time_string(self) -> str:
+        """Get human readable duration taken from start() to stop().
 
         Returns:
-            `float`: milliseconds as a float
+            `str`: human readable duration
         """
-        return self.time_nanosec / 1e6
+        value, units = self.time_units
+        return f"{value} {units}"
 
-    @property
-    def time_microsec(self) -> float:
-        """Get number of microseconds taken from start() to stop().
 
-        Returns:
-            `float`: microseconds as a float
-        """
-        return self.time_nanosec / 1e3
+def timed(
+    func: Optional[Callable] = None,
+    *,
+    timer_type: Literal[
+        "performance", "process", "long_running", "low_precision"
+    ] = "performance",
+) -> Callable:
+    """Decorator that records how long each call of a function takes.
 
-    @property
-    def time_units(self) -> dict:
-        """Get dictionary of time taken from start() to stop().
+    This is the lowest overhead way to time a function: the clock is looked up
+    once at decoration time and each call only reads it twice. There is no
+    `Timer` instance, no garbage collection toggling and nothing is printed.
+    The duration of the latest call, in nanoseconds, is kept on the decorated
+    function's `last_ns` attribute. Works for both sync and async functions.
 
-        Returns:
-            `float`: nanoseconds as a float
-        """
-        timers = [
-            {"units": "s", "value": self.time_sec},
-            {"units": "ms", "value": self.time_millisec},
-            {"units": "μs", "value": self.time_microsec},
-            {"units": "ns", "value": self.time_nanosec},
-        ]
+    `timed` always times, the `WRAPTIMER_DISABLE` switch only turns off the
+    `TimeIt` decorators. Code reads `last_ns`, so it has to stay set.
 
-        # print(timers)
+    Example:
 
-        filtered = list(filter(lambda t: t["value"] > 1, timers))
+    ```python
+    from wraptimer import timed
 
-        return filtered[0]
+    @timed
+    def func_to_time():
+        time.sleep(1)
 
-    @property
-    def time_string(self) -> str:
-        """Get human readable duration taken from start() to stop().
+    func_to_time()
+    print(func_to_time.last_ns)
+    ```
+    """
 
-        Returns:
-            `str`: human readable duration
-        """
-        took = self.time_units
-        return "{} {}".format(took["value"], took["units"])
-
-    def __get_counter(self) -> int:
-        counter: int
-        if self.timer_type == "performance":
-            counter = time.perf_counter_ns()
-        elif self.timer_type == "process":
-            counter = time.process_time_ns()
-        elif self.timer_type == "long_running":
-            counter = time.monotonic_ns()
-
-        return counter
-
-    def __valid_start_stop(self) -> Optional[NoReturn]:
-        if self._counter_start is None:
-            raise ValueError("Timer has not been started.")
-        if self._counter_stop is None:
-            raise ValueError("Timer has not been stopped.")
-        return None
+    # checked before returning the factory, so a bad timer_type fails early
+    counter, ns_scale = _resolve_counter(timer_type)
+
+    if func is None:
+        return lambda func: timed(func, timer_type=timer_type)
+
+    if asyncio.iscoroutinefunction(func):
+
+        @wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            start = counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                async_wrapper.last_ns = (counter() - start) * ns_scale
+
+        async_wrapper.last_ns = None
+        return async_wrapper
+
+    @wraps(func)
+    def sync_wrapper(*args, **kwargs):
+        start = counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            sync_wrapper.last_ns = (counter() - start) * ns_scale
+
+    sync_wrapper.last_ns = None
+    return sync_wrapper
+
+
+def _resolve_counter(timer_type: str) -> Tuple[Callable, float]:
+    """Look up the clock for a `timer_type` and its scale to nanoseconds.
+
+    Raises:
+        `ValueError`: when `timer_type` is not one of the known clocks
+    """
+    if timer_type not in _COUNTERS:
+        raise ValueError(
+            f"Unknown timer_type {timer_type!r}, use one of {list(_COUNTERS)}."
+        )
+    return _COUNTERS[timer_type], _NS_SCALE.get(timer_type, 1)
+
+
+def _disable_gc(freeze: bool = False) -> None:
+    global _gc_disable_depth, _gc_was_enabled, _gc_freeze_depth, _gc_froze
+    with _gc_lock:
+        if _gc_disable_depth == 0:
+            _gc_was_enabled = gc.isenabled()
+            if _gc_was_enabled:
+                gc.disable()
+        _gc_disable_depth += 1
+
+        if freeze:
+            if _gc_freeze_depth == 0:
+                # gc.unfreeze() thaws every frozen object, so leave the
+                # permanent generation alone if the application froze
+                # objects itself, e.g. before forking
+                _gc_froze = gc.get_freeze_count() <= _gc_base_freeze_count
+                if _gc_froze:
+                    gc.freeze()
+            _gc_freeze_depth += 1
+
+
+def _restore_gc(freeze: bool = False) -> None:
+    global _gc_disable_depth, _gc_freeze_depth
+    with _gc_lock:
+        if freeze:
+            _gc_freeze_depth -= 1
+            if _gc_freeze_depth == 0 and _gc_froze:
+                gc.unfreeze()
+
+        _gc_disable_depth -= 1
+        if _gc_disable_depth == 0 and _gc_was_enabled:
+            gc.enable()
+
+
+def _time_units(nanosec: float) -> TimeUnit:
+    """Pick the largest unit in which a nanosecond duration is at least 1.
+
+    Returns:
+        `TimeUnit`: the duration `(value, units)`
+    """
+    if nanosec >= _NS_PER_S:
+        return TimeUnit(nanosec / _NS_PER_S, "s")
+    if nanosec >= _NS_PER_MS:
+        return TimeUnit(nanosec / _NS_PER_MS, "ms")
+    if nanosec >= _NS_PER_US:
+        return TimeUnit(nanosec / _NS_PER_US, "μs")
+    return TimeUnit(nanosec, "ns")
+
+
+def _time_string(nanosec: float) -> str:
+    """Get human readable string of a nanosecond duration.
+
+    Returns:
+        `str`: human readable duration
+    """
+    value, units = _time_units(nanosec)
+    return f"{value} {units}"
@@ -6,12 +6,17 @@
 """
 
 import asyncio
+import contextvars
+import functools
 import os
 import sys
+import threading
+import time
+from typing import NamedTuple
 
 from termcolor import colored
 
-from .timer import Timer
+from .timer import _time_string
 
 try:
     term_size = os.get_terminal_size()
@@ -20,39 +25,235 @@ except Exception:
     term_size = 80
 
 
-class DebugContext:
-    """Debug context to trace any function calls inside the context"""
+def _use_color():
+    # same precedence termcolor uses, checked once instead of on every call
+    if os.environ.get("ANSI_COLORS_DISABLED"):
+        return False
+    if os.environ.get("NO_COLOR"):
+        return False
+    if os.environ.get("FORCE_COLOR"):
+        return True
+    try:
+        return sys.stdout.isatty()
+    except Exception:
+        return False
+
+
+_USE_COLOR = _use_color()
+
+
+def _c(text, *args, **kwargs):
+    """`termcolor.colored`, or the plain text when output isn't a terminal"""
+    if not _USE_COLOR:
+        return text
+    return colored(text, *args, force_color=True, **kwargs)
+
+
+_SEP_COLOR = "dark_grey"
+# separators only depend on the terminal width, so build them once
+_FULL_BAR = _c("━" * term_size, _SEP_COLOR)
+_MID_BAR = " " + _c("-" * (term_size - 2), _SEP_COLOR) + " "
+
+_HAS_MONITORING = sys.version_info >= (3, 12)
+
+# The DebugContext tracing the current thread / asyncio task. Trace callbacks
+# are process (monitoring) or thread (settrace) wide, so they look the tracer
+# up here and concurrent calls of the same function never share state.
+_current_tracer = contextvars.ContextVar("wraptimer_tracer", default=None)
+
+
+class TraceEntry(NamedTuple):
+    """Time taken by one traced line"""
+
+    func_type: str
+    func_name: str
+    line: int
+    took_ns: int
+
+    def report_dict(self):
+        """The `{"SYNC FUNC": name, "LINE": line, "TOOK": "1.2 ms"}` report form,
+        unlike the field-keyed `_asdict()`"""
+        return {
+            self.func_type: self.func_name,
+            "LINE": self.line,
+            "TOOK": _time_string(self.took_ns),
+        }
 
-    tracers = {}
 
-    def __init__(self, name, func, verbose=True):
+class DebugContext:
+    """Debug context to trace any function calls inside the context
+
+    On Python 3.12+ line events are delivered through `sys.monitoring`
+    (PEP 669) and scoped to the decorated function's code object only.
+    Older interpreters fall back to `sys.settrace`.
+
+    The active context is kept in a `ContextVar`, so the same function can be
+    traced concurrently from several threads or asyncio tasks.
+    """
+
+    __slots__ = (
+        "verbose",
+        "name",
+        "func",
+        "func_type_str",
+        "code",
+        "traced",
+        "line_count",
+        "_out_buf",
+        "_traced_raw",
+        "_append",
+        "_perf",
+        "_last",
+        "_prev_line",
+        "_returned",
+        "_min_line_ns",
+        "_skipped",
+        "_monitoring",
+        "_token",
+    )
+
+    # sys.monitoring.PROFILER_ID, claimed while at least one context is active
+    _tool_id = 2
+    _tool_users = 0
+    # code object -> number of active contexts with its local events enabled
+    _code_users = {}
+    _lock = threading.Lock()
+    # per thread count of active settrace contexts and the tracer they replaced
+    _settrace_state = threading.local()
+
+    def __init__(
+        self, name, func, verbose=True, func_type_str=None, code=None, min_line_ns=0
+    ):
         self.verbose = verbose
         self.name = name
         self.func = func
-        self.tracers[self.name] = sys.settrace
-        self.t = Timer()
+        # resolved once by the decorator, so tracing never has to inspect func
+        self.func_type_str = func_type_str or func_type_string(func)
+        self.code = code or func.__code__
         self.traced = []
         self.line_count = 0
+        self._out_buf = []
+        # raw (line, nanoseconds) pairs, formatted only once tracing is done
+        self._traced_raw = []
+        self._append = self._traced_raw.append
+        self._perf = time.perf_counter_ns
+        self._last = None
+        self._prev_line = None
+        self._returned = 0
+        self._min_line_ns = min_line_ns
+        self._skipped = 0
+        self._monitoring = False
+        self._token = None
 
     def __enter__(self):
         # print(f"Entering Debug Decorated func {self.name}")
-        # Set the trace function to the trace_calls function
-        # So all events are now traced
-        self.tracers[self.name](self.trace_calls)
+        self._token = _current_tracer.set(self)
+
+        if _HAS_MONITORING and self._claim_tool():
+            self._monitoring = True
+            self._start_monitoring()
+        else:
+            self._start_settrace()
 
     def __exit__(self, *args, **kwargs):
-        # Stop tracing all events
-        self.tracers[self.name] = None
+        if self._monitoring:
+            self._stop_monitoring()
+            self._release_tool()
+            self._monitoring = False
+        else:
+            self._stop_settrace()
+
+        _current_tracer.reset(self._token)
+        self._log_lines()
+
+    @classmethod
+    def _claim_tool(cls):
+        monitoring = sys.monitoring
+        events = monitoring.events
+
+        with cls._lock:
+            if cls._tool_users == 0:
+                try:
+                    monitoring.use_tool_id(cls._tool_id, "wraptimer")
+                except ValueError:
+                    # tool id taken by another profiler, use sys.settrace instead
+                    return False
+                tool_id = cls._tool_id
+                monitoring.register_callback(tool_id, events.LINE, _monitor_line)
+                monitoring.register_callback(tool_id, events.PY_START, _monitor_start)
+                monitoring.register_callback(tool_id, events.PY_RETURN, _monitor_return)
+                monitoring.register_callback(tool_id, events.PY_UNWIND, _monitor_unwind)
+                # PY_UNWIND can't be a local event, so it is on for every code
+                # object while the tool is claimed. It only fires when a frame
+                # exits through an exception, and _monitor_unwind filters those
+                monitoring.set_events(tool_id, events.PY_UNWIND)
+            cls._tool_users += 1
+            return True
+
+    @classmethod
+    def _release_tool(cls):
+        monitoring = sys.monitoring
+        events = monitoring.events
+
+        with cls._lock:
+            cls._tool_users -= 1
+            if cls._tool_users == 0:
+                monitoring.register_callback(cls._tool_id, events.LINE, None)
+                monitoring.register_callback(cls._tool_id, events.PY_START, None)
+                monitoring.register_callback(cls._tool_id, events.PY_RETURN, None)
+                monitoring.set_events(cls._tool_id, 0)
+                monitoring.register_callback(cls._tool_id, events.PY_UNWIND, None)
+                monitoring.free_tool_id(cls._tool_id)
+
+    def _start_monitoring(self):
+        monitoring = sys.monitoring
+        events = monitoring.events
+
+        with self._lock:
+            users = self._code_users.get(self.code, 0)
+            if users == 0:
+                monitoring.set_local_events(
+                    self._tool_id,
+                    self.code,
+                    events.LINE | events.PY_START | events.PY_RETURN,
+                )
+            self._code_users[self.code] = users + 1
+
+    def _stop_monitoring(self):
+        with self._lock:
+            users = self._code_users.pop(self.code) - 1
+            if users:
+                self._code_users[self.code] = users
+            else:
+                sys.monitoring.set_local_events(self._tool_id, self.code, 0)
+
+    def _start_settrace(self):
+        state = self._settrace_state
+        depth = getattr(state, "depth", 0)
+        if depth == 0:
+            # Set the trace function to the trace_calls function
+            # So all events are now traced
+            state.prev_trace = sys.gettrace()
+            sys.settrace(_trace_calls)
+        state.depth = depth + 1
+
+    def _stop_settrace(self):
+        state = self._settrace_state
+        state.depth -= 1
+        if state.depth == 0:
+            # Stop tracing, handing back to any tracer that was active before us
+            sys.settrace(state.prev_trace)
+            state.prev_trace = None
 
     def trace_calls(self, frame, event, arg):
-        # We want to only trace our call to the decorated function
-        if event != "call":
-            return
-        elif frame.f_code.co_name != self.name:
-            return
+        # We want to only trace our call to the decorated function.
+        # Returning None tells the interpreter not to send line events
+        # for any other frame, e.g. helpers the function calls.
+        if event != "call" or frame.f_code is not self.code:
+            return None
         # return the trace function to use when you go into that
 
-        self.t.start()
+        self._on_start()
         # function call
         return self.trace_lines
 
@@ -62,54 +263,136 @@ class DebugContext:
         # If you want to print local variables only on return
         # check only for the 'return' event
 
-        if event not in ["line"] or frame.f_lasti == 0:
-            return
-
-        took = 0
+        if event == "line":
+            self._on_line(frame.f_code, frame.f_lineno)
+        elif event == "return":
+            self._on_return()
+
+    def _on_start(self, code=None, instruction_offset=None):
+        # coroutines fire a start/call event on every resume, only the first counts
+        if self._last is None:
+            self._last = self._perf()
+
+    def _on_line(self, code, line_no):
+        # Runs once per executed line, _monitor_line repeats this body.
+        # A line event closes the line executed before it,
+        # so that is the line the elapsed time is recorded against
+        now = self._perf()
+        took_ns = now - self._last
+        if took_ns >= self._min_line_ns:
+            self._append((self._prev_line, took_ns))
+        elif self._prev_line is not None:
+            self._skipped += 1
+        self._last = now
+        self._prev_line = line_no
+
+    def _on_return(self, code=None, instruction_offset=None, retval=None):
+        # No line event follows the last line, so leaving the function,
+        # by returning or by raising, closes it.
+        # Coroutines also "return" on every suspension, so only the time is
+        # kept here and _log_lines uses it if no line ran after it
+        self._returned = self._perf()
+
+    def _log_lines(self):
+        title = f"{self.func_type_str}: {self.name}"
+
+        if self._prev_line is not None and self._returned >= self._last:
+            took_ns = self._returned - self._last
+            if took_ns >= self._min_line_ns:
+                self._append((self._prev_line, took_ns))
+            else:
+                self._skipped += 1
 
-        if not self.t._is_started:
-            self.t.start()
-        else:
-            self.t.stop()
-            took = self.t.time_string
-            self.t.start()
-
-        # self.t.stop()
-        # pprint(dir(frame))
-        # if frame.f_lasti==0:
-        co = frame.f_code
-        func_name = co.co_name
-        line_no = frame.f_lineno - 1
-        # filename = co.co_filename
-        # local_vars = frame.f_lo
-
-        func_type = "ASYNC" if asyncio.iscoroutinefunction(self.func) else "SYNC"
-
-        self.traced.append(
-            {
-                f"{func_type} FUNC": func_name,
-                "LINE": line_no,
-                "TOOK": took,
-            }
-        )
-
-        self.line_count += 1
-
-        # if verbose, log
         if self.verbose:
-            draw_sep = None
-            line_str = f"LINE: {line_no}, "
+            # the title bar heads the output even when no line was timed
+            self._out_buf += ["", _title_bar(title)]
+
+        for line_no, took_ns in self._traced_raw:
+            # time before the first line is call overhead, not a line
+            if line_no is None:
+                continue
+
+            self.traced.append(
+                TraceEntry(self.func_type_str, self.name, line_no, took_ns)
+            )
 
-            if self.line_count == 1:
-                draw_sep = "top"
+            self.line_count += 1
 
-            log(
-                what=line_str,
-                t=took,
-                draw_sep=draw_sep,
-                title=f"{func_type} FUNC: {func_name}",
+            # if verbose, log
+            if self.verbose:
+                log(
+                    what=f"LINE: {line_no}, ",
+                    t=_time_string(took_ns),
+                    title=title,
+                    buffer=self._out_buf,
+                )
+
+        if self.verbose and self._skipped:
+            threshold = _time_string(self._min_line_ns)
+            self._out_buf.append(
+                _c(f" ({self._skipped} lines < {threshold} skipped)", "white")
             )
 
+        # one write for all lines rather than one print per line
+        if self._out_buf:
+            sys.stdout.write("\n".join(self._out_buf) + "\n")
+
+
+def _monitor_start(code, instruction_offset):
+    tracer = _current_tracer.get()
+    if tracer is not None and code is tracer.code:
+        tracer._on_start()
+
+
+def _monitor_line(code, line_no):
+    # DebugContext._on_line inlined, so each monitored line runs one frame
+    tracer = _current_tracer.get()
+    if tracer is None or code is not tracer.code:
+        return
+    now = tracer._perf()
+    took_ns = now - tracer._last
+    if took_ns >= tracer._min_line_ns:
+        tracer._append((tracer._prev_line, took_ns))
+    elif tracer._prev_line is not None:
+        tracer._skipped += 1
+    tracer._last = now
+    tracer._prev_line = line_no
+
+
+def _monitor_return(code, instruction_offset, retval):
+    tracer = _current_tracer.get()
+    if tracer is not None and code is tracer.code:
+        tracer._on_return()
+
+
+def _monitor_unwind(code, instruction_offset, exception):
+    tracer = _current_tracer.get()
+    if tracer is not None and code is tracer.code:
+        tracer._on_return()
+
+
+def _trace_calls(frame, event, arg):
+    tracer = _current_tracer.get()
+    if tracer is None:
+        return None
+    return tracer.trace_calls(frame, event, arg)
+
+
+def func_type_string(func):
+    """Label a function as "ASYNC FUNC" or "SYNC FUNC" for the logs"""
+    return "ASYNC FUNC" if asyncio.iscoroutinefunction(func) else "SYNC FUNC"
+
+
+@functools.lru_cache(maxsize=128)
+def _title_bar(title):
+    """Build the `━━━ [ title ] ━━━` separator once per title"""
+    if not title:
+        return "━" * term_size
+
+    center_len = int((term_size - (len(title) + 6)) / 2)
+    bar = _c("━" * center_len, _SEP_COLOR)
+    return bar + _c(f" [ {title} ] ", "blue", attrs=["bold"]) + bar
+
 
 def log(
     what,
@@ -120,33 +403,26 @@ def log(
     show_args=False,
     return_trace=False,
     draw_sep=False,
+    buffer=None,
 ):
-    """Logger function for the wraptimer"""
+    """Logger function for the wraptimer
+
+    When a `buffer` list is passed the output lines are appended to it
+    instead of being written, so callers can emit many logs in one write.
+    """
 
     # print(what, return_trace)
-    what_str = ""
-    if callable(what):
-        func_type = "ASYNC" if asyncio.iscoroutinefunction(what) else "SYNC"
-        what_str = ""
-        title = f"{func_type} FUNC: {what.__name__}"
-    else:
-        what_str = what
+    what_str = what
 
     t_str = t if isinstance(t, str) else t.time_string
 
     log_arr = []
 
     if show_args:
-        args = (
-            [f" ARGS: {args}", f" KWARGS: {kwargs}"]
-            if return_trace
-            else [
-                colored(f" ARGS: {args}", "cyan"),
-                colored(f" KWARGS: {kwargs}", "cyan"),
-            ]
-        )
-
-        log_arr = log_arr + args
+        if return_trace:
+            log_arr += [f" ARGS: {args}", f" KWARGS: {kwargs}"]
+        else:
+            log_arr.append(_c(f" ARGS: {args}\n KWARGS: {kwargs}", "cyan"))
 
     if return_trace:
         log_arr.append(f" {what_str}TOOK: {t_str}")
@@ -154,30 +430,22 @@ def log(
     else:
         color = "white" if "LINE" in what_str else "blue"
         attrs = ["bold"] if color != "white" else []
-        log_arr.append(colored(f" {what_str}TOOK: {t_str}", color, attrs=attrs))
+        log_arr.append(_c(f" {what_str}TOOK: {t_str}", color, attrs=attrs))
 
         # print(log_arr)
         draw_sep = [draw_sep] if not isinstance(draw_sep, list) else draw_sep
-        sep_color = "dark_grey"
+        out = [] if buffer is None else buffer
 
         if "all" in draw_sep or "top" in draw_sep:
-            if title:
-                center_len = int((term_size - (len(title) + 6)) / 2)
-                sep_str = colored("━" * center_len, sep_color)
-                sep_str = (
-                    sep_str + colored(f" [ {title} ] ", "blue", attrs=["bold"]) + sep_str
-                )
-            else:
-                sep_str = "━" * term_size
-
-            print()
-            print(sep_str)
+            out += ["", _title_bar(title)]
 
         if "all" in draw_sep or "mid" in draw_sep:
-            print(" " + colored("-" * (term_size - 2), sep_color) + " ")
+            out.append(_MID_BAR)
 
-        print("\n".join(log_arr))
+        out += log_arr
 
         if "all" in draw_sep or "bottom" in draw_sep:
-            print(colored("━" * term_size, sep_color))
-            print()
+            out += [_FULL_BAR, ""]
+
+        if buffer is None:
+            sys.stdout.write("\n".join(out) + "\n")